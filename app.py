@@ -1,7 +1,10 @@
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask
+from flask_caching import Cache
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
@@ -9,13 +12,18 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (set LOG_LEVEL=DEBUG for verbose output)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
+cache = Cache()
+# Pool for CPU-heavy work (password hashing) off the request thread
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tiffin')
+# Single worker so .env writes land in the order the settings were saved
+env_sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tiffin-env')
 
 # Create the app
 app = Flask(__name__)
@@ -26,22 +34,35 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
-    "pool_pre_ping": True,
+    # Pre-ping costs a SELECT 1 per checkout; enable it only for flaky networks
+    "pool_pre_ping": os.environ.get("DB_PREPING", "0") == "1",
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": 10,
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Initialize the app with the extension
+# Configure caching (per-process by default; set CACHE_TYPE=RedisCache to share it)
+app.config["CACHE_TYPE"] = os.environ.get("CACHE_TYPE", "SimpleCache")
+app.config["CACHE_DEFAULT_TIMEOUT"] = 300
+app.config["CACHE_REDIS_URL"] = os.environ.get("CACHE_REDIS_URL")
+
+# Initialize the app with the extensions
 db.init_app(app)
+cache.init_app(app)
 
 with app.app_context():
     # Import models to ensure tables are created
     import models  # noqa: F401
     import auth  # noqa: F401
-    db.create_all()
+    
+    # Only create tables when some are missing, skipping per-table checks on warm starts
+    existing_tables = set(inspect(db.engine).get_table_names())
+    if not existing_tables.issuperset(db.metadata.tables):
+        db.create_all()
     
     # Initialize default settings if they don't exist
-    from models import User, Settings
-    from werkzeug.security import generate_password_hash
+    from models import Settings
     
     # Initialize default settings
     if not Settings.query.filter_by(key='CENTRAL_LAT').first():
@@ -52,23 +73,46 @@ with app.app_context():
         Settings.set_value('SERVICE_RADIUS_KM', os.environ.get("SERVICE_RADIUS_KM", "5"), 
                           'Service radius in kilometers')
     
-    # Create admin user if it doesn't exist
-    admin_email = os.environ.get("ADMIN_EMAIL", "admin@tiffinservice.com")
+    # Decide once whether location checks read the service area from the database
+    from location_utils import init_settings_source
+    init_settings_source()
+
+@app.cli.command("init-admin")
+def init_admin():
+    """Create the admin user if it doesn't exist (run once per deploy)"""
+    from models import User, Settings
+    from sqlalchemy.dialects.postgresql import insert
+    from werkzeug.security import generate_password_hash
+    
+    admin_email = os.environ.get("ADMIN_EMAIL", "admin@tiffinservice.com").strip().lower()
     admin_password = os.environ.get("ADMIN_PASSWORD", "admin123")
     
-    admin_user = User.query.filter_by(email=admin_email).first()
-    if not admin_user:
-        central_lat, central_lng = Settings.get_central_coordinates()
-        admin_user = User(
-            name="Admin",
-            email=admin_email,
-            phone="1234567890",
-            password_hash=generate_password_hash(admin_password),
-            address="Admin Address",
-            latitude=central_lat,
-            longitude=central_lng,
-            is_admin=True
-        )
-        db.session.add(admin_user)
-        db.session.commit()
+    # Older bootstraps stored the email as typed, so match it case-insensitively
+    admin_exists = db.session.query(
+        User.query.filter(db.func.lower(User.email) == admin_email).exists()
+    ).scalar()
+    if admin_exists:
+        logging.info(f"Admin user already exists: {admin_email}")
+        return
+    
+    central_lat, central_lng = Settings.get_central_coordinates()
+    
+    # Idempotent INSERT; any unique conflict (email or lower(email)) from a
+    # concurrent run on another host is skipped
+    stmt = insert(User.__table__).values(
+        name="Admin",
+        email=admin_email,
+        phone="1234567890",
+        password_hash=generate_password_hash(admin_password, method='scrypt'),
+        address="Admin Address",
+        latitude=central_lat,
+        longitude=central_lng,
+        is_admin=True
+    ).on_conflict_do_nothing()
+    result = db.session.execute(stmt)
+    db.session.commit()
+    
+    if result.rowcount:
         logging.info(f"Admin user created with email: {admin_email}")
+    else:
+        logging.info(f"Admin user already exists: {admin_email}")
@@ -1,7 +1,10 @@
+import hashlib
+import hmac
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from functools import wraps
+from functools import wraps, lru_cache
 from flask import redirect, url_for, flash
-from app import app
+from werkzeug.security import check_password_hash
+from app import app, db
 from models import User
 
 # Initialize Flask-Login
@@ -13,7 +16,41 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return db.session.get(User, int(user_id))
+
+@lru_cache(maxsize=8)
+def _kdf_params(method):
+    """Parse a Werkzeug hash method such as 'scrypt:32768:8:1' once per distinct value"""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2**15, 8, 1)
+        return name, (n, r, p, 132 * n * r * p)
+    if name == 'pbkdf2' and len(args) == 2:
+        return name, (args[0], int(args[1]))
+    return None
+
+def verify_password(pw_hash, password):
+    """Check a password against a Werkzeug hash with a constant-time compare"""
+    try:
+        method, salt, expected = pw_hash.split('$', 2)
+    except ValueError:
+        return False
+    
+    params = _kdf_params(method)
+    if params is None:
+        # Less common formats go through Werkzeug's own parser
+        return check_password_hash(pw_hash, password)
+    
+    name, args = params
+    salt = salt.encode('utf-8')
+    password = password.encode('utf-8')
+    if name == 'scrypt':
+        n, r, p, maxmem = args
+        actual = hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=maxmem).hex()
+    else:
+        hash_name, iterations = args
+        actual = hashlib.pbkdf2_hmac(hash_name, password, salt, iterations).hex()
+    return hmac.compare_digest(actual, expected)
 
 def admin_required(f):
     """Decorator to require admin privileges"""
@@ -1,9 +1,33 @@
 import os
 import math
-import re
+import logging
+import shutil
+import tempfile
+import threading
+import numpy as np
 from dotenv import load_dotenv
+from sqlalchemy.exc import SQLAlchemyError
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Service area from the environment, used when the database is not available
+_ENV_FALLBACK = (
+    float(os.environ.get("CENTRAL_LAT", "20.457316")),
+    float(os.environ.get("CENTRAL_LNG", "75.016754")),
+    float(os.environ.get("SERVICE_RADIUS_KM", "5")),
+)
+
+# Whether service settings can be read from the database, set by init_settings_source()
+_HAS_DB_SETTINGS = False
+
+# Mean radius of Earth in kilometers
+_R = 6371.0
+
+# Keys that update_env_file keeps in sync with the database settings
+_ENV_KEYS = ('CENTRAL_LAT', 'CENTRAL_LNG', 'SERVICE_RADIUS_KM')
+_ENV_FILE_LOCK = threading.Lock()
+
 def calculate_distance(lat1, lng1, lat2, lng2):
     """
     Calculate the distance between two points on Earth using Haversine formula
@@ -22,31 +46,109 @@ def calculate_distance(lat1, lng1, lat2, lng2):
     a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng/2)**2
     c = 2 * math.asin(math.sqrt(a))
     
-    # Radius of Earth in kilometers
-    r = 6371
+    return c * _R
+
+def calculate_distance_vector(lat1, lng1, lats, lngs):
+    """
+    Calculate the distances from one point to many points using Haversine formula
+    `lats` and `lngs` are array-likes of equal length
+    Returns a NumPy array of distances in kilometers
+    """
+    lat1_rad = math.radians(lat1)
+    lng1_rad = math.radians(lng1)
+    lats_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs_rad = np.radians(np.asarray(lngs, dtype=np.float64))
+    
+    dlat = lats_rad - lat1_rad
+    dlng = lngs_rad - lng1_rad
     
-    return c * r
+    a = np.sin(dlat * 0.5)**2 + math.cos(lat1_rad) * np.cos(lats_rad) * np.sin(dlng * 0.5)**2
+    return 2 * _R * np.arcsin(np.sqrt(a))
 
-def is_location_serviceable(lat, lng):
+# Central point and the terms derived from it, recomputed only when the
+# settings change: (lat, lng, radius_km, kx, ky, radius_sq, box_dlat, box_dlng)
+_CENTRAL = None
+
+def init_settings_source():
     """
-    Check if a location is within the serviceable area (5km radius)
+    Check once whether service settings can be read from the database
+    Must run inside an app context; afterwards lookups skip the check
     """
+    global _HAS_DB_SETTINGS
     try:
         from models import Settings
-        # Get dynamic central coordinates from database
-        central_lat, central_lng = Settings.get_central_coordinates()
-        service_radius = Settings.get_service_radius()
-    except:
-        # Fallback to environment variables if database not available
-        central_lat = float(os.environ.get("CENTRAL_LAT", "20.457316"))
-        central_lng = float(os.environ.get("CENTRAL_LNG", "75.016754"))
-        service_radius = float(os.environ.get("SERVICE_RADIUS_KM", "5"))
+        Settings.get_service_area()
+        _HAS_DB_SETTINGS = True
+    except Exception as e:
+        logger.warning("Service settings unavailable, using environment fallback: %s", e)
+        _HAS_DB_SETTINGS = False
+    return _HAS_DB_SETTINGS
+
+def _discard_failed_settings_read(error):
+    """Roll back a failed settings read so the request can carry on with the fallback"""
+    from app import db
+    logger.warning("Service settings lookup failed, using fallback: %s", error)
+    db.session.rollback()
+
+def _bounding_box_offsets(lat, radius_km):
+    """
+    Half-height and half-width in degrees of the smallest lat/lng box that
+    contains every point within radius_km of a point at latitude `lat`
+    """
+    angle = radius_km / _R
+    dlat = math.degrees(angle)
+    ratio = math.sin(angle) / math.cos(math.radians(lat))
+    dlng = math.degrees(math.asin(ratio)) if ratio < 1 else 180.0
+    return dlat, dlng
+
+def _ruler_coeffs(lat0):
+    """
+    Kilometers per degree of longitude and of latitude around latitude `lat0`
+    Flat-earth (cheap ruler) scale factors, accurate over a city-sized area
+    """
+    ky = _R * math.pi / 180
+    return ky * math.cos(math.radians(lat0)), ky
+
+def _get_central():
+    """Return the central point tuple for the current service settings"""
+    global _CENTRAL
+    # Fallback to environment variables if database not available
+    central_lat, central_lng, service_radius = _ENV_FALLBACK
+    if _HAS_DB_SETTINGS:
+        from models import Settings
+        try:
+            # Get dynamic central coordinates from database
+            central_lat, central_lng, service_radius = Settings.get_service_area()
+        except SQLAlchemyError as e:
+            _discard_failed_settings_read(e)
+    
+    if _CENTRAL is None or _CENTRAL[:3] != (central_lat, central_lng, service_radius):
+        kx, ky = _ruler_coeffs(central_lat)
+        box_dlat, box_dlng = _bounding_box_offsets(central_lat, service_radius)
+        _CENTRAL = (central_lat, central_lng, service_radius,
+                    kx, ky, service_radius**2, box_dlat, box_dlng)
+    return _CENTRAL
+
+def is_location_serviceable(lat, lng):
+    """
+    Check if a location is within the serviceable area (5km radius)
+    """
+    central = _get_central()
+    logger.debug("central=(%s,%s) query=(%s,%s)", central[0], central[1], lat, lng)
+    central_lat, central_lng, _, kx, ky, radius_sq, box_dlat, box_dlng = central
     
-    print(f"Loaded from settings: {central_lat} {central_lng}")
-    print(f"{central_lat} {central_lng} {lat} {lng}")
+    # Offsets in degrees from the central point, wrapping longitude at +/-180
+    dlat = lat - central_lat
+    dlng = (lng - central_lng + 180) % 360 - 180
     
-    distance = calculate_distance(central_lat, central_lng, lat, lng)
-    return distance <= service_radius
+    # Reject points outside the bounding box before any distance math
+    if abs(dlat) > box_dlat or abs(dlng) > box_dlng:
+        return False
+    
+    # Compare squared planar distances in km to skip the sqrt
+    dx = dlng * kx
+    dy = dlat * ky
+    return dx * dx + dy * dy <= radius_sq
 
 def get_location_from_address(address):
     """
@@ -55,14 +157,16 @@ def get_location_from_address(address):
     or OpenStreetMap Nominatim to convert address to lat/lng coordinates.
     For now, we'll return default coordinates.
     """
-    try:
+    # Fallback coordinates
+    central_lat = 20.457316
+    central_lng = 75.016754
+    if _HAS_DB_SETTINGS:
         from models import Settings
-        # Get dynamic central coordinates from database
-        central_lat, central_lng = Settings.get_central_coordinates()
-    except:
-        # Fallback coordinates
-        central_lat = 20.457316
-        central_lng = 75.016754
+        try:
+            # Get dynamic central coordinates from database
+            central_lat, central_lng = Settings.get_central_coordinates()
+        except SQLAlchemyError as e:
+            _discard_failed_settings_read(e)
     
     return {
         'latitude': central_lat,
@@ -77,41 +181,53 @@ def update_env_file(central_lat, central_lng, service_radius):
     """
     env_file_path = '.env'
     
-    try:
-        # Read existing .env file
-        if os.path.exists(env_file_path):
-            with open(env_file_path, 'r') as file:
-                content = file.read()
-        else:
-            content = ""
-        
-        # Update or add each setting
-        settings_to_update = {
-            'CENTRAL_LAT': str(central_lat),
-            'CENTRAL_LNG': str(central_lng),
-            'SERVICE_RADIUS_KM': str(service_radius)
-        }
-        
-        for key, value in settings_to_update.items():
-            # Check if the key already exists
-            pattern = rf'^{key}\s*=.*$'
-            replacement = f'{key}={value}'
-            
-            if re.search(pattern, content, re.MULTILINE):
-                # Update existing value
-                content = re.sub(pattern, replacement, content, flags=re.MULTILINE)
+    # Serialize writers; this may run on a background thread
+    with _ENV_FILE_LOCK:
+        try:
+            # Read existing .env file
+            if os.path.exists(env_file_path):
+                with open(env_file_path, 'r') as file:
+                    content = file.read()
             else:
-                # Add new value
-                if content and not content.endswith('\n'):
-                    content += '\n'
-                content += f'{key}={value}\n'
-        
-        # Write updated content back to .env file
-        with open(env_file_path, 'w') as file:
-            file.write(content)
+                content = ""
             
-        print(f"Updated .env file with new coordinates: {central_lat}, {central_lng}, radius: {service_radius}")
-        
-    except Exception as e:
-        print(f"Error updating .env file: {e}")
-        # Don't raise the exception to avoid breaking the settings update
+            # Update or add each setting
+            values = (central_lat, central_lng, service_radius)
+            settings_to_update = {key: str(value) for key, value in zip(_ENV_KEYS, values)}
+            
+            # Rewrite matching lines in a single pass over the file
+            lines = []
+            seen = set()
+            for line in content.splitlines():
+                key = line.partition('=')[0].rstrip()
+                if key in settings_to_update and '=' in line:
+                    lines.append(f'{key}={settings_to_update[key]}')
+                    seen.add(key)
+                else:
+                    lines.append(line)
+            
+            # Add settings that were not in the file yet
+            for key, value in settings_to_update.items():
+                if key not in seen:
+                    lines.append(f'{key}={value}')
+            
+            # Write to a temporary file and swap it in so the .env is never half-written
+            env_dir = os.path.dirname(os.path.abspath(env_file_path))
+            fd, tmp_file_path = tempfile.mkstemp(dir=env_dir, prefix='.env.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as file:
+                    file.write('\n'.join(lines) + '\n')
+                # Keep the original permissions, the file holds secrets
+                if os.path.exists(env_file_path):
+                    shutil.copymode(env_file_path, tmp_file_path)
+                os.replace(tmp_file_path, env_file_path)
+            except BaseException:
+                os.unlink(tmp_file_path)
+                raise
+            
+            logger.info("Updated .env file with new coordinates: %s, %s, radius: %s",
+                        central_lat, central_lng, service_radius)
+            
+        except Exception as e:
+            logger.error("Error updating .env file: %s", e)
+            # Don't raise the exception to avoid breaking the settings update
@@ -1,5 +1,13 @@
+import os
 from app import app
 import routes  # noqa: F401
+from tasks import start_scheduler
 
 if __name__ == "__main__":
+    # With the reloader only the child process that serves requests runs the jobs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_scheduler()
     app.run(host="0.0.0.0", port=5000, debug=True)
+elif os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+    # Loaded by a WSGI server such as gunicorn; flask CLI commands skip the jobs
+    start_scheduler()
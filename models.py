@@ -1,6 +1,15 @@
-from datetime import datetime
-from app import db
+import time
+from datetime import datetime, date
+from app import db, cache
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
+
+# Settings change rarely, so all rows are cached in-process for a short time
+SETTINGS_CACHE_TTL = 30  # seconds
+_settings_cache = {}
+_settings_cache_ts = 0
+# Parsed (central_lat, central_lng, service_radius_km), rebuilt after each reload
+_service_area = None
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -9,19 +18,30 @@ class User(UserMixin, db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(15), nullable=False)
-    password_hash = db.Column(db.String(256), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)  # room for scrypt and pbkdf2 hashes
     address = db.Column(db.Text, nullable=False)
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
     is_admin = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # kept in step with orders
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    orders = db.relationship('Order', backref='customer', lazy=True)
+    orders = db.relationship('Order', back_populates='customer', lazy=True)
+    
+    @validates('email')
+    def _normalize_email(self, key, email):
+        return email.strip().lower()
+
+# Emails are stored lowercased; enforce case-insensitive uniqueness in the database too
+db.Index('ix_user_email_lower', db.func.lower(User.email), unique=True)
 
 class MenuItem(db.Model):
     __tablename__ = 'menu_items'
+    __table_args__ = (
+        db.Index('ix_menuitem_date_avail', 'date', 'is_available'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -30,12 +50,30 @@ class MenuItem(db.Model):
     price_full = db.Column(db.Float, nullable=False)  # Full tiffin price
     price_roti_only = db.Column(db.Float, nullable=False)  # Roti only price
     is_available = db.Column(db.Boolean, default=True)
-    date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date())
+    date = db.Column(db.Date, nullable=False, default=date.today)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    orders = db.relationship('Order', back_populates='menu_item', lazy=True)
+    
+    @staticmethod
+    @cache.memoize(timeout=300)
+    def get_todays_menu(today):
+        """Available items for the given day; cleared whenever menu items change"""
+        return MenuItem.query.filter_by(date=today, is_available=True).all()
+    
+    @staticmethod
+    def invalidate_menu_cache():
+        cache.delete_memoized(MenuItem.get_todays_menu)
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_order_user_created', 'user_id', 'created_at'),
+        db.Index('ix_orders_status_date', 'status', 'order_date'),
+        db.Index('ix_order_date', 'order_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -49,12 +87,13 @@ class Order(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, approved, denied, delivered
     notes = db.Column(db.Text, nullable=True)
     admin_notes = db.Column(db.Text, nullable=True)
-    order_date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date())
+    order_date = db.Column(db.Date, nullable=False, default=date.today)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    menu_item = db.relationship('MenuItem', backref='orders', lazy=True)
+    customer = db.relationship('User', back_populates='orders', lazy=True)
+    menu_item = db.relationship('MenuItem', back_populates='orders', lazy=True)
 
 class Feedback(db.Model):
     __tablename__ = 'feedback'
@@ -75,7 +114,7 @@ class Settings(db.Model):
     __tablename__ = 'settings'
     
     id = db.Column(db.Integer, primary_key=True)
-    key = db.Column(db.String(50), unique=True, nullable=False)
+    key = db.Column(db.String(50), unique=True, nullable=False, index=True)
     value = db.Column(db.Text, nullable=False)
     description = db.Column(db.Text, nullable=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -84,10 +123,19 @@ class Settings(db.Model):
     def __repr__(self):
         return f'<Settings {self.key}: {self.value}>'
     
+    @staticmethod
+    def _cached_values():
+        """Return all settings as a dict, reloading them once the TTL expires"""
+        global _settings_cache, _settings_cache_ts, _service_area
+        if time.time() - _settings_cache_ts >= SETTINGS_CACHE_TTL:
+            _settings_cache = {s.key: s.value for s in Settings.query.all()}
+            _settings_cache_ts = time.time()
+            _service_area = None
+        return _settings_cache
+    
     @staticmethod
     def get_value(key, default=None):
-        setting = Settings.query.filter_by(key=key).first()
-        return setting.value if setting else default
+        return Settings._cached_values().get(key, default)
     
     @staticmethod
     def set_value(key, value, description=None, user_id=None):
@@ -106,14 +154,38 @@ class Settings(db.Model):
             )
             db.session.add(setting)
         db.session.commit()
+        Settings.invalidate_cache()
         return setting
     
+    @staticmethod
+    def invalidate_cache():
+        global _settings_cache_ts
+        _settings_cache_ts = 0
+    
+    @staticmethod
+    def get_many(keys):
+        values = Settings._cached_values()
+        return {key: values[key] for key in keys if key in values}
+    
+    @staticmethod
+    def get_service_area():
+        """Return (central_lat, central_lng, service_radius_km) in one lookup"""
+        global _service_area
+        # Reloading the settings after the TTL also clears the parsed tuple
+        Settings._cached_values()
+        if _service_area is None:
+            values = Settings.get_many(('CENTRAL_LAT', 'CENTRAL_LNG', 'SERVICE_RADIUS_KM'))
+            lat = float(values.get('CENTRAL_LAT', '20.457316'))
+            lng = float(values.get('CENTRAL_LNG', '75.016754'))
+            radius = float(values.get('SERVICE_RADIUS_KM', '5'))
+            _service_area = (lat, lng, radius)
+        return _service_area
+    
     @staticmethod
     def get_central_coordinates():
-        lat = float(Settings.get_value('CENTRAL_LAT', '20.457316'))
-        lng = float(Settings.get_value('CENTRAL_LNG', '75.016754'))
+        lat, lng, _ = Settings.get_service_area()
         return lat, lng
     
     @staticmethod
     def get_service_radius():
-        return float(Settings.get_value('SERVICE_RADIUS_KM', '5'))
+        return Settings.get_service_area()[2]
@@ -1,20 +1,22 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, abort
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import selectinload
 from datetime import datetime, date
 import json
 
-from app import app, db
+from app import app, db, cache, executor, env_sync_executor
 from models import User, MenuItem, Order, Feedback, Settings
-from auth import admin_required
-from location_utils import is_location_serviceable, get_location_from_address, calculate_distance, update_env_file
+from auth import admin_required, verify_password
+from location_utils import is_location_serviceable, get_location_from_address, calculate_distance, calculate_distance_vector, update_env_file
+
+# Verified against when the email is unknown, so login takes as long either way
+_DUMMY_HASH = generate_password_hash("x" * 16)
 
 @app.route('/')
 def index():
     """Home page"""
-    # Auto-disable expired menu items
-    from tasks import disable_expired_menu_items
-    disable_expired_menu_items()
     if current_user.is_authenticated:
         if current_user.is_admin:
             return redirect(url_for('admin_dashboard'))
@@ -23,7 +25,7 @@ def index():
     
     # Get today's menu for display
     today = date.today()
-    menu_items = MenuItem.query.filter_by(date=today, is_available=True).all()
+    menu_items = MenuItem.get_todays_menu(today)
     
     return render_template('index.html', menu_items=menu_items)
 
@@ -35,7 +37,7 @@ def register():
     
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
-        email = request.form.get('email', '').strip().lower()
+        email = request.form.get('email', '').strip()
         phone = request.form.get('phone', '').strip()
         password = request.form.get('password', '')
         confirm_password = request.form.get('confirm_password', '')
@@ -57,7 +59,7 @@ def register():
             return render_template('register.html')
         
         # Check if user already exists
-        if User.query.filter_by(email=email).first():
+        if db.session.query(User.query.filter(func.lower(User.email) == func.lower(email)).exists()).scalar():
             flash('Email already registered. Please use a different email.', 'danger')
             return render_template('register.html')
         
@@ -111,16 +113,17 @@ def login():
         return redirect(url_for('index'))
     
     if request.method == 'POST':
-        email = request.form.get('email', '').strip().lower()
+        email = request.form.get('email', '').strip()
         password = request.form.get('password', '')
         
         if not email or not password:
             flash('Please enter both email and password.', 'danger')
             return render_template('login.html')
         
-        user = User.query.filter_by(email=email).first()
+        user = User.query.filter(func.lower(User.email) == func.lower(email)).first()
+        valid = verify_password(user.password_hash if user else _DUMMY_HASH, password)
         
-        if user and check_password_hash(user.password_hash, password):
+        if user and valid:
             login_user(user)
             next_page = request.args.get('next')
             flash(f'Welcome back, {user.name}!', 'success')
@@ -146,11 +149,13 @@ def user_dashboard():
         return redirect(url_for('admin_dashboard'))
     
     # Get user's recent orders
-    recent_orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).limit(10).all()
+    recent_orders = Order.query.options(selectinload(Order.menu_item)).filter_by(
+        user_id=current_user.id
+    ).order_by(Order.created_at.desc()).limit(10).all()
     
     # Get today's menu
     today = date.today()
-    menu_items = MenuItem.query.filter_by(date=today, is_available=True).all()
+    menu_items = MenuItem.get_todays_menu(today)
     
     return render_template('user_dashboard.html', 
                          recent_orders=recent_orders, 
@@ -163,26 +168,40 @@ def admin_dashboard():
     # Get today's statistics
     today = date.today()
     
+    # All four counts in one round-trip: conditional aggregates over orders,
+    # plus scalar subqueries for users and menu items
+    total_users = select(func.count(User.id)).where(User.is_admin == False).scalar_subquery()
+    menu_items_today = select(func.count(MenuItem.id)).where(
+        MenuItem.date == today, MenuItem.is_available == True
+    ).scalar_subquery()
+    counts = db.session.execute(
+        select(
+            func.count(case((Order.order_date == today, 1))),
+            func.count(case((Order.status == 'pending', 1))),
+            total_users,
+            menu_items_today
+        ).select_from(Order)
+    ).one()
+    
     stats = {
-        'total_orders_today': Order.query.filter_by(order_date=today).count(),
-        'pending_orders': Order.query.filter_by(status='pending').count(),
-        'total_users': User.query.filter_by(is_admin=False).count(),
-        'menu_items_today': MenuItem.query.filter_by(date=today, is_available=True).count()
+        'total_orders_today': counts[0],
+        'pending_orders': counts[1],
+        'total_users': counts[2],
+        'menu_items_today': counts[3]
     }
     
-    # Recent orders
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+    # Recent orders, with customers and menu items loaded up front for the table
+    recent_orders = Order.query.options(
+        selectinload(Order.customer), selectinload(Order.menu_item)
+    ).order_by(Order.created_at.desc()).limit(10).all()
     
     return render_template('admin_dashboard.html', stats=stats, recent_orders=recent_orders)
 
 @app.route('/menu')
 def menu():
     """Display today's menu"""
-    # Auto-disable expired menu items
-    from tasks import disable_expired_menu_items
-    disable_expired_menu_items()
     today = date.today()
-    menu_items = MenuItem.query.filter_by(date=today, is_available=True).all()
+    menu_items = MenuItem.get_todays_menu(today)
     
     # Group by meal type
     menu_by_type = {}
@@ -201,7 +220,7 @@ def place_order(menu_item_id):
         flash('Admins cannot place orders.', 'warning')
         return redirect(url_for('admin_dashboard'))
     
-    menu_item = MenuItem.query.get_or_404(menu_item_id)
+    menu_item = db.session.get(MenuItem, menu_item_id) or abort(404)
     
     if not menu_item.is_available:
         flash('This menu item is not available.', 'warning')
@@ -258,6 +277,8 @@ def place_order(menu_item_id):
         
         try:
             db.session.add(order)
+            # Incremented in SQL so concurrent orders can't lose an update
+            current_user.order_count = User.order_count + 1
             db.session.commit()
             flash('Order placed successfully! You will be notified once it\'s approved.', 'success')
             return redirect(url_for('user_dashboard'))
@@ -275,7 +296,8 @@ def admin_orders():
     status_filter = request.args.get('status', 'all')
     page = request.args.get('page', 1, type=int)
     
-    query = Order.query
+    # Load customers and menu items in one query each instead of one per row
+    query = Order.query.options(selectinload(Order.customer), selectinload(Order.menu_item))
     
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
@@ -287,8 +309,16 @@ def admin_orders():
     # Get current central coordinates for navigation
     central_lat, central_lng = Settings.get_central_coordinates()
     
+    # Distance of every delivery location from the central point in one vectorized call
+    distances = calculate_distance_vector(
+        central_lat, central_lng,
+        [order.delivery_lat for order in orders.items],
+        [order.delivery_lng for order in orders.items]
+    )
+    
     return render_template('admin_orders.html', 
                          orders=orders, 
+                         orders_with_distance=zip(orders.items, distances.tolist()),
                          current_status=status_filter,
                          central_lat=central_lat,
                          central_lng=central_lng)
@@ -297,7 +327,7 @@ def admin_orders():
 @admin_required
 def update_order_status(order_id):
     """Update order status"""
-    order = Order.query.get_or_404(order_id)
+    order = db.session.get(Order, order_id) or abort(404)
     new_status = request.form.get('status')
     admin_notes = request.form.get('admin_notes', '').strip()
     
@@ -326,7 +356,7 @@ def update_profile():
     """Update user profile"""
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
-        email = request.form.get('email', '').strip().lower()
+        email = request.form.get('email', '').strip()
         phone = request.form.get('phone', '').strip()
         address = request.form.get('address', '').strip()
         current_password = request.form.get('current_password', '')
@@ -339,8 +369,10 @@ def update_profile():
             return render_template('profile.html')
         
         # Check if email is already taken by another user
-        existing_user = User.query.filter(User.email == email, User.id != current_user.id).first()
-        if existing_user:
+        email_taken = db.session.query(
+            User.query.filter(func.lower(User.email) == func.lower(email), User.id != current_user.id).exists()
+        ).scalar()
+        if email_taken:
             flash('Email address is already in use.', 'danger')
             return render_template('profile.html')
         
@@ -350,10 +382,6 @@ def update_profile():
                 flash('Current password is required to change password.', 'danger')
                 return render_template('profile.html')
             
-            if not check_password_hash(current_user.password_hash, current_password):
-                flash('Current password is incorrect.', 'danger')
-                return render_template('profile.html')
-            
             if new_password != confirm_password:
                 flash('New passwords do not match.', 'danger')
                 return render_template('profile.html')
@@ -361,6 +389,13 @@ def update_profile():
             if len(new_password) < 6:
                 flash('New password must be at least 6 characters long.', 'danger')
                 return render_template('profile.html')
+            
+            # Hash the new password while the current one is verified
+            password_hash_future = executor.submit(generate_password_hash, new_password)
+            
+            if not verify_password(current_user.password_hash, current_password):
+                flash('Current password is incorrect.', 'danger')
+                return render_template('profile.html')
         
         # Update user information
         current_user.name = name
@@ -376,7 +411,7 @@ def update_profile():
             current_user.longitude = longitude
         
         if new_password:
-            current_user.password_hash = generate_password_hash(new_password)
+            current_user.password_hash = password_hash_future.result()
         
         try:
             db.session.commit()
@@ -420,28 +455,35 @@ def admin_users():
 @admin_required
 def toggle_user_status(user_id):
     """Toggle user active status"""
-    user = User.query.get_or_404(user_id)
     data = request.get_json()
+    active = data.get('active', True)
     
-    if user.is_admin and not data.get('active', True):
-        return jsonify({'success': False, 'message': 'Cannot deactivate admin users'}), 400
-    
-    user.is_active = data.get('active', True)
+    stmt = update(User).where(User.id == user_id).values(is_active=active)
+    if not active:
+        # Admin users cannot be deactivated
+        stmt = stmt.where(User.is_admin.is_not(True))
     
     try:
+        result = db.session.execute(stmt)
         db.session.commit()
-        return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"User status toggle error: {e}")
         return jsonify({'success': False}), 500
+    
+    if not result.rowcount:
+        # Nothing matched: either the user doesn't exist or is an admin
+        if db.session.get(User, user_id) is None:
+            abort(404)
+        return jsonify({'success': False, 'message': 'Cannot deactivate admin users'}), 400
+    
+    return jsonify({'success': True})
 
 @app.route('/admin/user/<int:user_id>/details')
 @admin_required
 def user_details(user_id):
     """Get user details for admin"""
-    user = User.query.get_or_404(user_id)
-    order_count = Order.query.filter_by(user_id=user_id).count()
+    user = db.session.get(User, user_id) or abort(404)
     
     return jsonify({
         'id': user.id,
@@ -454,16 +496,13 @@ def user_details(user_id):
         'is_active': user.is_active,
         'is_admin': user.is_admin,
         'created_at': user.created_at.isoformat(),
-        'order_count': order_count
+        'order_count': user.order_count
     })
 
 @app.route('/admin/menu')
 @admin_required
 def admin_menu():
     """Admin menu management"""
-    # Auto-disable expired menu items
-    from tasks import disable_expired_menu_items
-    disable_expired_menu_items()
     selected_date = request.args.get('date')
     if selected_date:
         try:
@@ -516,6 +555,7 @@ def add_menu_item():
     try:
         db.session.add(menu_item)
         db.session.commit()
+        MenuItem.invalidate_menu_cache()
         flash('Menu item added successfully.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -528,18 +568,26 @@ def add_menu_item():
 @admin_required
 def toggle_menu_item(item_id):
     """Toggle menu item availability"""
-    menu_item = MenuItem.query.get_or_404(item_id)
-    menu_item.is_available = not menu_item.is_available
-    menu_item.updated_at = datetime.utcnow()
+    stmt = update(MenuItem).where(MenuItem.id == item_id).values(
+        is_available=~MenuItem.is_available,
+        updated_at=datetime.utcnow()
+    ).returning(MenuItem.date, MenuItem.is_available)
     
     try:
+        menu_item = db.session.execute(stmt).one_or_none()
         db.session.commit()
-        status = "enabled" if menu_item.is_available else "disabled"
-        flash(f'Menu item {status} successfully.', 'success')
     except Exception as e:
         db.session.rollback()
         flash('Failed to update menu item.', 'danger')
         app.logger.error(f"Menu item toggle error: {e}")
+        return redirect(url_for('admin_menu'))
+    
+    if menu_item is None:
+        abort(404)
+    
+    MenuItem.invalidate_menu_cache()
+    status = "enabled" if menu_item.is_available else "disabled"
+    flash(f'Menu item {status} successfully.', 'success')
     
     return redirect(url_for('admin_menu', date=menu_item.date.strftime('%Y-%m-%d')))
 
@@ -547,8 +595,7 @@ def toggle_menu_item(item_id):
 @admin_required
 def admin_settings():
     """Admin settings page"""
-    central_lat, central_lng = Settings.get_central_coordinates()
-    service_radius = Settings.get_service_radius()
+    central_lat, central_lng, service_radius = Settings.get_service_area()
     
     return render_template('admin_settings.html', 
                          central_lat=central_lat, 
@@ -579,9 +626,10 @@ def update_admin_settings():
                           'Central service location longitude', current_user.id)
         Settings.set_value('SERVICE_RADIUS_KM', str(service_radius), 
                           'Service radius in kilometers', current_user.id)
+        cache.delete('service_config')
         
-        # Update .env file to maintain synchronization
-        update_env_file(central_lat, central_lng, service_radius)
+        # Sync the .env file in the background; the database is authoritative
+        env_sync_executor.submit(update_env_file, central_lat, central_lng, service_radius)
         
         flash('Settings updated successfully! Service area configuration has been updated across all systems.', 'success')
         return redirect(url_for('admin_settings'))
@@ -608,18 +656,21 @@ def check_location():
         app.logger.error(f"Location check error: {e}")
         return jsonify({'error': 'Failed to check location'}), 500
 
+@cache.cached(timeout=300, key_prefix='service_config')
+def _service_config():
+    """Current service configuration; errors propagate so the fallback is never cached"""
+    central_lat, central_lng, service_radius = Settings.get_service_area()
+    return {
+        'central_lat': central_lat,
+        'central_lng': central_lng,
+        'service_radius': service_radius
+    }
+
 @app.route('/api/service-config')
 def get_service_config():
     """API endpoint to get current service configuration"""
     try:
-        central_lat, central_lng = Settings.get_central_coordinates()
-        service_radius = Settings.get_service_radius()
-        
-        return jsonify({
-            'central_lat': central_lat,
-            'central_lng': central_lng,
-            'service_radius': service_radius
-        })
+        return jsonify(_service_config())
     except Exception as e:
         app.logger.error(f"Service config error: {e}")
         return jsonify({
@@ -2,33 +2,42 @@
 Background tasks for the Tiffin Service application
 """
 from datetime import datetime, date
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import func, inspect, select, text, update
 from app import app, db
-from models import MenuItem
+from models import MenuItem, Order, User
 import logging
 
+# Date of the last successful expiry sweep in this process
+_LAST_EXPIRY_RUN = None
+
+# Scheduler running the periodic jobs, created by start_scheduler()
+_SCHEDULER = None
+
 def disable_expired_menu_items():
     """
     Disable menu items that have passed their date
-    This function should be called periodically (e.g., daily)
+    Scheduled daily by start_scheduler(); repeated calls on the same day return early
     """
+    global _LAST_EXPIRY_RUN
+    today = date.today()
+    if _LAST_EXPIRY_RUN == today:
+        return 0
+    
     with app.app_context():
         try:
-            today = date.today()
-            
-            # Find all active menu items with dates before today
-            expired_items = MenuItem.query.filter(
-                MenuItem.date < today,
-                MenuItem.is_available == True
-            ).all()
-            
-            count = 0
-            for item in expired_items:
-                item.is_available = False
-                item.updated_at = datetime.utcnow()
-                count += 1
+            # Disable all active menu items with dates before today in one statement
+            result = db.session.execute(
+                update(MenuItem)
+                .where(MenuItem.date < today, MenuItem.is_available == True)
+                .values(is_available=False, updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+            count = result.rowcount
+            _LAST_EXPIRY_RUN = today
             
             if count > 0:
-                db.session.commit()
+                MenuItem.invalidate_menu_cache()
                 logging.info(f"Disabled {count} expired menu items")
             
             return count
@@ -47,6 +56,40 @@ def get_expired_items_count():
             MenuItem.is_available == True
         ).count()
 
+def start_scheduler():
+    """
+    Sweep expired menu items at startup and then daily just after midnight
+    Call only from the process that serves requests
+    """
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = BackgroundScheduler(daemon=True)
+        _SCHEDULER.add_job(disable_expired_menu_items, 'cron', hour=0, minute=5,
+                           next_run_time=datetime.now())
+        _SCHEDULER.start()
+    return _SCHEDULER
+
+@app.cli.command("sync-order-counts")
+def sync_user_order_counts():
+    """Recompute every user's order_count from the orders table"""
+    # Databases created before the counter existed lack the column (there are no migrations)
+    columns = {column['name'] for column in inspect(db.engine).get_columns(User.__tablename__)}
+    if 'order_count' not in columns:
+        db.session.execute(text(
+            'ALTER TABLE users ADD COLUMN order_count INTEGER NOT NULL DEFAULT 0'
+        ))
+        logging.info("Added the users.order_count column")
+    
+    order_count = select(func.count(Order.id)).where(
+        Order.user_id == User.id
+    ).scalar_subquery()
+    result = db.session.execute(
+        update(User).values(order_count=order_count),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    logging.info(f"Synced order counts for {result.rowcount} users")
+
 if __name__ == "__main__":
     # Run the task manually
     count = disable_expired_menu_items()